@@ -1,19 +1,31 @@
 #!/usr/bin/python3
 
 import argparse
+import concurrent.futures
+import contextlib
 import logging
 import os
 import feedparser
 from feedgen.feed import FeedGenerator
-from newspaper import Article
 from sqlitecache import SQliteCacheHandler
+import extractors
+import feedserver
+import profiling
+import requestcounter
 import dateutil
 import datetime
 import yaml
 import my_timezones
 import json
+import re
 import sys
 import requests
+import threading
+import time
+
+
+# lastBuildDate is set to now by FeedGenerator when the feed and its entries have no date
+LAST_BUILD_DATE = re.compile(rb'<lastBuildDate>[^<]*</lastBuildDate>')
 
 
 def json_serial(obj):
@@ -26,7 +38,9 @@ def json_serial(obj):
     raise TypeError('Type {0} not serializable'.format(type(obj)))
 
 
-def generate_new_feed(logger, website, feed, cache_disabled, cookies, output_file):
+def generate_new_feed(logger, website, feed, cache_disabled, cookies, output_file, extractor=None, workers=1,
+                      time_budget=None, run_deadline=None, feed_store=None, progressive=False, sq=None,
+                      prepared_feed=None):
     """
     Generate the new feed
 
@@ -42,44 +56,212 @@ def generate_new_feed(logger, website, feed, cache_disabled, cookies, output_fil
     :type feed: dictionary
     :param output_file: full path where to save the generated RSS feed, provided in the config.yml
     :type output_file: string
+    :param extractor: extraction engine selected in the config.yml, newspaper if not provided
+    :type extractor: ContentExtractor object
+    :param workers: number of articles fetched at the same time, provided in the config.yml
+    :type workers: integer
+    :param time_budget: seconds available to fetch the articles of this feed, provided in the config.yml
+    :type time_budget: float
+    :param run_deadline: time.monotonic() value when the whole run has to stop fetching articles
+    :type run_deadline: float
+    :param feed_store: feeds served by --serve, updated with the new feed
+    :type feed_store: FeedStore object
+    :param progressive: boolean if the feed is written with the summaries first, provided in the config.yml
+    :type progressive: boolean
+    :param sq: SQliteCacheHandler class shared by the whole run, a new one is opened for this feed if not provided
+    :type sq: SQliteCacheHandler object
+    :param prepared_feed: feed already parsed by prepare_new_feed, and already published if progressive
+    :type prepared_feed: dictionary
+    """
+    with contextlib.ExitStack() as stack:
+        if sq is None and not cache_disabled:
+            # Opened only for this feed, closed at the end so that all the queued writes are committed
+            sq = stack.enter_context(SQliteCacheHandler(logger))
+
+        start = time.monotonic()
+
+        if prepared_feed is None:
+            prepared_feed = prepare_new_feed(logger, website, feed, cache_disabled, sq)
+            if progressive:
+                publish_summaries(logger, prepared_feed, output_file, feed_store)
+
+        # The feed has to be written by the earliest between its own deadline and the deadline of the whole run
+        deadline = run_deadline
+        if time_budget is not None:
+            feed_deadline = start + time_budget
+            deadline = feed_deadline if deadline is None else min(deadline, feed_deadline)
+
+        new_feed_elements = prepared_feed['new_feed_elements']
+
+        # Get the full article for the entries not in cache
+        contents = dict(prepared_feed['contents'])
+        contents.update(fetch_contents(logger, cache_disabled, sq, new_feed_elements['feed_link'],
+                                       prepared_feed['links_to_fetch'], cookies, extractor, workers, deadline))
+
+        # Generate the feed file
+        fg = build_new_feed(logger, new_feed_elements, prepared_feed['new_feed_entries'], contents, progressive)
+        write_feed(logger, fg, output_file, feed_store)
+        logger.debug('New feed written to: {0} in {1:.1f}s'.format(output_file, time.monotonic() - start))
+
+        if not cache_disabled:
+            # Clean the DB
+            list_of_all_entries_links = prepared_feed['list_of_all_entries_links']
+            logger.debug('list_of_all_entries_links: {0}'.format(json.dumps(list_of_all_entries_links, indent=4)))
+            sq.clean(new_feed_elements['feed_link'], list_of_all_entries_links)
+
+
+def prepare_new_feed(logger, website, feed, cache_disabled, sq):
+    """
+    Parse the feed and get the full article of the entries already in cache
+
+    :param logger: custom logger
+    :type logger: logger object
+    :param website: name of the website provided in the config.yml
+    :type website: string
+    :param feed: feed URL provided in the config.yml
+    :type feed: string
+    :param cache_disabled: boolean if the cache is disabled
+    :type cache_disabled: boolean
+    :param sq: SQliteCacheHandler class
+    :type sq: SQliteCacheHandler object
+    :return prepared_feed: new_feed_elements, new_feed_entries, list_of_all_entries_links, contents found in cache
+                           and links_to_fetch
+    :rtype prepared_feed: dictionary
     """
     new_feed_elements = parse_the_feed(logger, website, feed)
-    fg = initialize_feed(logger, new_feed_elements)
 
     # Create a list with all the links of the entries present in the feed
     # It is going to be used to delete older records in the database
     list_of_all_entries_links = list()
 
-    # Initialize class SQliteCacheHandler
-    sq = None
-    if not cache_disabled:
-        sq = SQliteCacheHandler(logger)
-
     # Parse all the entries of the feed
+    new_feed_entries = list()
     for entry in new_feed_elements['feed_entries']:
         new_feed_entry = parse_an_entry(logger, entry)
+        new_feed_entries.append(new_feed_entry)
 
+        # Entries skipped because of the deadline are in this list as well, so their cached content is kept
         list_of_all_entries_links.append(new_feed_entry['entry_link'])
 
-        # Get the full article for this entry
-        content = get_full_content_from_entry_link(logger, cache_disabled, sq, new_feed_elements['feed_link'],
-                                                   new_feed_entry['entry_link'], cookies)
+    # Get the full article of the entries already in cache
+    contents, links_to_fetch = get_cached_contents(logger, cache_disabled, sq, list_of_all_entries_links)
+
+    return {
+        'new_feed_elements': new_feed_elements,
+        'new_feed_entries': new_feed_entries,
+        'list_of_all_entries_links': list_of_all_entries_links,
+        'contents': contents,
+        'links_to_fetch': links_to_fetch,
+    }
+
+
+def publish_summaries(logger, prepared_feed, output_file, feed_store=None):
+    """
+    Write the feed straight away, with the summaries of the entries that are not in cache
+
+    :param logger: custom logger
+    :type logger: logger object
+    :param prepared_feed: feed returned by prepare_new_feed
+    :type prepared_feed: dictionary
+    :param output_file: full path where to save the generated RSS feed
+    :type output_file: string
+    :param feed_store: feeds served by --serve, updated with the new feed
+    :type feed_store: FeedStore object
+    """
+    if not prepared_feed['links_to_fetch']:
+        # Every article is in cache, the complete feed is going to be written without fetching anything
+        return
+
+    fg = build_new_feed(logger, prepared_feed['new_feed_elements'], prepared_feed['new_feed_entries'],
+                        prepared_feed['contents'], True)
+    write_feed(logger, fg, output_file, feed_store)
+    logger.debug('New feed written to: {0} with {1} summaries'.format(output_file,
+                                                                       len(prepared_feed['links_to_fetch'])))
+
+
+def build_new_feed(logger, new_feed_elements, new_feed_entries, contents, progressive=False):
+    """
+    Create the new feed with the entries that have a content
+
+    :param logger: custom logger
+    :type logger: logger object
+    :param new_feed_elements: elements of the new feed that we are going to generate
+    :type new_feed_elements: dictionary
+    :param new_feed_entries: entries of the feed, as returned by parse_an_entry
+    :type new_feed_entries: list
+    :param contents: full content of the website page for each entry link
+    :type contents: dictionary
+    :param progressive: boolean if the summary is used for the entries without the full content
+    :type progressive: boolean
+    :return fg: FeedGenerator class with the entries
+    :rtype fg: FeedGenerator object
+    """
+    fg = initialize_feed(logger, new_feed_elements)
+
+    # FeedGenerator sets lastBuildDate to now, changing the feed, and the ETag served by --serve, at every generation.
+    # Use the newest date of the content instead, so the feed stays the same until its content changes. Without any
+    # date write_feed keeps the lastBuildDate of the previous version
+    build_dates = list()
+    if 'feed_pubdate' in new_feed_elements:
+        build_dates.append(new_feed_elements['feed_pubdate'])
+
+    for new_feed_entry in new_feed_entries:
+        content = contents.get(new_feed_entry['entry_link'])
+        if content is None and progressive:
+            content = new_feed_entry.get('entry_summary')
 
         if content is not None:
             # As we have been able to get the full article, add the entry to the new feed that we are creating
             fg = add_entry_to_new_feed(logger, fg, new_feed_entry, content)
+            if 'entry_pubdate' in new_feed_entry:
+                build_dates.append(new_feed_entry['entry_pubdate'])
         else:
             logger.debug('The content for the entry link {0} is empty, not adding this entry to the new feed'.
                          format(new_feed_entry['entry_link']))
 
-    # Generate the feed file
-    fg.rss_file(output_file)
-    logger.debug('New feed written to: {0}'.format(output_file))
+    # Dates without a timezone can't be compared with the others and feedgen refuses them
+    build_dates = [build_date for build_date in build_dates
+                   if isinstance(build_date, datetime.datetime) and build_date.tzinfo is not None]
+    if build_dates:
+        fg.lastBuildDate(max(build_dates))
+
+    return fg
+
+
+def write_feed(logger, fg, output_file, feed_store=None):
+    """
+    Write the generated feed to the output file and publish it to the feeds served by --serve
+
+    :param logger: custom logger
+    :type logger: logger object
+    :param fg: FeedGenerator class
+    :type fg: FeedGenerator object
+    :param output_file: full path where to save the generated RSS feed, provided in the config.yml
+    :type output_file: string
+    :param feed_store: feeds served by --serve, None if not serving
+    :type feed_store: FeedStore object
+    """
+    rss = fg.rss_str()
+
+    try:
+        with open(output_file, 'rb') as f:
+            previous_rss = f.read()
+    except OSError:
+        previous_rss = None
+
+    if previous_rss is not None and LAST_BUILD_DATE.sub(b'', previous_rss) == LAST_BUILD_DATE.sub(b'', rss):
+        # Keep the previous lastBuildDate, so that the feed, and the ETag served by --serve, don't change
+        logger.debug('Feed {0} unchanged, keeping the previous version'.format(output_file))
+        rss = previous_rss
+    else:
+        # Write a temporary file and rename it, so that whoever reads the output file never gets a partial feed
+        temporary_file = '{0}.tmp'.format(output_file)
+        with open(temporary_file, 'wb') as f:
+            f.write(rss)
+        os.replace(temporary_file, output_file)
 
-    if not cache_disabled:
-        # Clean the DB
-        logger.debug('list_of_all_entries_links: {0}'.format(json.dumps(list_of_all_entries_links, indent=4)))
-        sq.clean(new_feed_elements['feed_link'], list_of_all_entries_links)
+    if feed_store is not None:
+        feed_store.publish(feedserver.feed_name(output_file), rss)
 
 
 def parse_the_feed(logger, website, feed):
@@ -213,13 +395,123 @@ def parse_an_entry(logger, entry):
     new_feed_entry['entry_link'] = entry['link']
     logger.debug('entry_link: {0}'.format(new_feed_entry['entry_link']))
 
+    if entry.get('summary'):
+        # Used in place of the full article until it has been fetched, see progressive in the config.yml
+        new_feed_entry['entry_summary'] = entry['summary']
+
     logger.debug('new_feed_entry: {0}'.format(json.dumps(new_feed_entry, indent=4, default=json_serial)))
     return new_feed_entry
 
 
-def get_full_content_from_entry_link(logger, cache_disabled, sq, feed_link, entry_link, cookies):
+def get_cached_contents(logger, cache_disabled, sq, entries_links):
+    """
+    Search the full content of the entries in cache
+
+    :param logger: custom logger
+    :type logger: logger object
+    :param cache_disabled: boolean if the cache is disabled
+    :type cache_disabled: boolean
+    :param sq: SQliteCacheHandler class
+    :type sq: SQliteCacheHandler object
+    :param entries_links: links of the entries of the feed
+    :type entries_links: list
+    :return contents, links_to_fetch: content for each entry link found in cache, links not found in cache
+    :rtype contents, links_to_fetch: dictionary, list
+    """
+
+    contents = dict()
+    links_to_fetch = list()
+
+    for entry_link in entries_links:
+        if entry_link in contents or entry_link in links_to_fetch:
+            continue
+
+        search_result = None
+        if not cache_disabled:
+            # First search if we have already stored this article in cache
+            search_result = sq.search(entry_link)
+
+        if search_result:
+            logger.debug('Article found in SQLite, grabbing the content from the database')
+            contents[entry_link] = search_result[4]
+        else:
+            logger.debug('Article not found in SQLite, grabbing the content for: {0}'.format(entry_link))
+            links_to_fetch.append(entry_link)
+
+    return contents, links_to_fetch
+
+
+def fetch_contents(logger, cache_disabled, sq, feed_link, links_to_fetch, cookies, extractor=None, workers=1,
+                   deadline=None):
+    """
+    Fetch the full content of the website pages with a pool of workers, storing it in cache
+
+    When the deadline is reached the outstanding fetches are cancelled and their links are left out.
+
+    :param logger: custom logger
+    :type logger: logger object
+    :param cache_disabled: boolean if the cache is disabled
+    :type cache_disabled: boolean
+    :param sq: SQliteCacheHandler class
+    :type sq: SQliteCacheHandler object
+    :param feed_link: link of the retrieved feed. Used to store it into the SQLite database.
+    :type feed_link: string
+    :param links_to_fetch: links of the entries to fetch
+    :type links_to_fetch: list
+    :param cookies: cookies to use to retrieve the content
+    :type cookies: dictionary
+    :param extractor: extraction engine used to get the readable content
+    :type extractor: ContentExtractor object
+    :param workers: number of articles fetched at the same time
+    :type workers: integer
+    :param deadline: time.monotonic() value when the fetches have to stop, None to wait for all of them
+    :type deadline: float
+    :return contents: content of the entire website page for each fetched link, None if not available
+    :rtype contents: dictionary
+    """
+
+    contents = dict()
+
+    if not links_to_fetch:
+        return contents
+
+    if deadline is not None and deadline <= time.monotonic():
+        logger.warning('Time budget exhausted for {0}, skipping {1} articles'.format(feed_link, len(links_to_fetch)))
+        return contents
+
+    # The requests of a fetch abandoned because of the deadline are reported with the section that started it
+    section = requestcounter.current_section()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    futures = {executor.submit(profiling.call, requestcounter.call, section, fetch_and_store_content, logger,
+                               cache_disabled, sq, feed_link, entry_link, cookies, extractor, deadline): entry_link
+               for entry_link in links_to_fetch}
+    timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+
+    try:
+        for future in concurrent.futures.as_completed(futures, timeout=timeout):
+            entry_link = futures[future]
+            try:
+                content = future.result()
+            except Exception as e:
+                logger.warning('Unable to fetch the article for link {0}, error: {1}'.format(entry_link, e))
+                content = None
+            contents[entry_link] = content
+    except concurrent.futures.TimeoutError:
+        skipped = [futures[future] for future in futures if not future.done()]
+        logger.warning('Time budget exhausted for {0}, skipping {1} articles'.format(feed_link, len(skipped)))
+        logger.debug('Skipped articles: {0}'.format(json.dumps(skipped, indent=4)))
+    finally:
+        # Don't wait for the fetches still running, they are left out of the feed. fetch_html stops them shortly
+        # after the deadline, if they are still extracting they are stored in cache if they complete in time
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return contents
+
+
+def fetch_and_store_content(logger, cache_disabled, sq, feed_link, entry_link, cookies, extractor=None,
+                            deadline=None):
     """
-    Retrieve the full content of the website page using the link in the entry feed
+    Retrieve the full content of a website page and store it in cache, run by the workers of fetch_contents
 
     :param logger: custom logger
     :type logger: logger object
@@ -233,28 +525,17 @@ def get_full_content_from_entry_link(logger, cache_disabled, sq, feed_link, entr
     :type entry_link: string
     :param cookies: cookies to use to retrieve the content
     :type cookies: dictionary
+    :param extractor: extraction engine used to get the readable content
+    :type extractor: ContentExtractor object
+    :param deadline: time.monotonic() value when the download has to stop, None for no limit
+    :type deadline: float
     :return content: content of the entire website page
     :rtype content: string
     """
+    content = get_readable_content(logger, cookies, entry_link, extractor, deadline)
 
-    search_result = None
-    content = None
-
-    if not cache_disabled:
-        # First search if we have already stored this article in cache
-        search_result = sq.search(entry_link)
-        if search_result:
-            logger.debug('Article found in SQLite, grabbing the content from the database')
-            content = search_result[4]
-
-    # If cache is disabled or the previous search_result didn't return anything, retrieve the content
-    if cache_disabled or (search_result is None):
-        # Get the full article
-        logger.debug('Article not found in SQLite, grabbing the content')
-        content = get_readable_content(logger, cookies, entry_link)
-
-    # If cache is not disabled and search_result was empty and I have a content, store the content in SQLite
-    if (not cache_disabled) and (search_result is None) and (content is not None):
+    # If cache is not disabled and I have a content, store the content in SQLite
+    if (not cache_disabled) and (content is not None):
         logger.debug('Storing the content in SQLite for: {0}'.format(entry_link))
         sq.insert(feed_link, entry_link, datetime.datetime.now(), content)
 
@@ -293,7 +574,49 @@ def add_entry_to_new_feed(logger, fg, entry, content):
     return fg
 
 
-def get_readable_content(logger, cookies, link):
+def fetch_html(cookies, link, deadline=None):
+    """
+    Download the HTML of a website page
+
+    :param cookies: cookies to use to retrieve the content
+    :type cookies: dictionary
+    :param link: link in the entry feed
+    :type link: string
+    :param deadline: time.monotonic() value when the download has to stop, None for no limit
+    :type deadline: float
+    :return html: HTML of the website page
+    :rtype html: string
+    """
+
+    # The timeout of requests applies to every network read, not to the whole download,
+    # so it is lowered to the time left and the deadline is checked after every chunk
+    timeout = 20
+    if deadline is not None:
+        time_left = deadline - time.monotonic()
+        if time_left <= 0:
+            raise requests.Timeout('Time budget exhausted before downloading {0}'.format(link))
+        timeout = min(timeout, time_left)
+
+    # Use requests to retrieve the content so that we can pass cookies
+    with requests.session() as s, requestcounter.own_requests():
+        headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:49.0) Gecko/20100101 Firefox/49.0'}
+        response = s.get(link, headers=headers, cookies=cookies, timeout=timeout, stream=True)
+
+        chunks = list()
+        for chunk in response.iter_content(chunk_size=65536):
+            if deadline is not None and time.monotonic() > deadline:
+                response.close()
+                raise requests.Timeout('Time budget exhausted while downloading {0}'.format(link))
+            chunks.append(chunk)
+
+    try:
+        return b''.join(chunks).decode(response.encoding or 'utf-8', errors='replace')
+    except LookupError:
+        # Unknown charset in the Content-Type header
+        return b''.join(chunks).decode('utf-8', errors='replace')
+
+
+def get_readable_content(logger, cookies, link, extractor=None, deadline=None):
     """
     Retrieves the full content of a website page given the link in the entry feed
 
@@ -303,46 +626,258 @@ def get_readable_content(logger, cookies, link):
     :type link: string
     :param cookies: cookies to use to retrieve the content 
     :type cookies: dictionary
+    :param extractor: extraction engine, newspaper if not provided
+    :type extractor: ContentExtractor object
+    :param deadline: time.monotonic() value when the download has to stop, None for no limit
+    :type deadline: float
     :return content: full content
     :rtype content: string
     """
 
     logger.debug('Fetching full article for {0}'.format(link))
 
-    # Use requests to retrieve the content so that we can pass cookies
-    with requests.session() as s:
-        headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:49.0) Gecko/20100101 Firefox/49.0'}
-        response = s.get(link, headers=headers, cookies=cookies, timeout=20)
+    if extractor is None:
+        extractor = extractors.NewspaperExtractor(logger)
+
+    html = fetch_html(cookies, link, deadline)
+
+    return extractor.extract(link, html)
+
+
+def benchmark_feed(logger, website, feed, cookies, extractor):
+    """
+    Compare the extraction engine selected for a feed against newspaper, using the entries currently in the feed
+
+    :param logger: custom logger
+    :type logger: logger object
+    :param website: name of the website provided in the config.yml
+    :type website: string
+    :param feed: feed URL provided in the config.yml
+    :type feed: string
+    :param cookies: cookies provided in the config.yml
+    :type cookies: dictionary
+    :param extractor: extraction engine selected in the config.yml
+    :type extractor: ContentExtractor object
+    """
+    new_feed_elements = parse_the_feed(logger, website, feed)
 
-        article = Article(url=link, keep_article_html=True)
-        
+    # Download every page only once, so that the network doesn't count in the comparison
+    documents = list()
+    for entry in new_feed_elements['feed_entries']:
+        link = parse_an_entry(logger, entry)['entry_link']
         try:
-            article.download(input_html=response.text)
-        except Exception as e:
-            logger.warning('Unable to download the article for link {0}, error: {1}'.format(link, e))
-            return None
-        else:
-            if not article.html:
-                logger.debug('HTML content is empty for link: {0}'.format(link))
-                return None
+            documents.append((link, fetch_html(cookies, link)))
+        except requests.RequestException as e:
+            logger.warning('Unable to download {0} for the benchmark, error: {1}'.format(link, e))
+
+    reference = extractors.NewspaperExtractor(logger)
+    if isinstance(extractor, extractors.NewspaperExtractor):
+        # Nothing to compare against newspaper itself, use the lxml readability heuristics
+        extractor = extractors.LxmlExtractor(logger)
+
+    results = extractors.benchmark_extractors(logger, reference, extractor, documents)
+    print('{0}: {1} articles, newspaper {2:.2f} articles/sec, {3} {4:.2f} articles/sec, similarity {5:.1%}'.format(
+        website, results['articles'], results['newspaper_articles_per_sec'], extractor.name,
+        results['{0}_articles_per_sec'.format(extractor.name)], results['similarity']))
+
+
+def read_section(logger, config_data, website):
+    """
+    Read the options of a section of the config.yml
+
+    :param logger: custom logger
+    :type logger: logger object
+    :param config_data: content of the config.yml
+    :type config_data: dictionary
+    :param website: name of the section
+    :type website: string
+    :return section: website, feed, cookies, output_file, extractor, workers, time_budget and progressive
+    :rtype section: dictionary
+    """
+    logger.debug('Reading configuration for {0}'.format(website))
+    feed = config_data[website]['feed']
+    logger.debug('Feed to parse: {0}'.format(feed))
+
+    if 'cookies' in config_data[website]:
+        cookies = config_data[website]['cookies']
+        logger.debug('Cookies: {0}'.format(cookies))
+    else:
+        cookies = dict()
+
+    output_file = config_data[website]['output_file']
+    logger.debug('Output file: {0}'.format(output_file))
+
+    try:
+        extractor = extractors.build_extractor(logger, config_data[website].get('extractor'))
+    except extractors.ExtractorError as e:
+        logger.error('Invalid extractor for {0}: {1}'.format(website, e))
+        sys.exit(1)
+    logger.debug('Extractor: {0}'.format(extractor.name))
+
+    workers = config_data[website].get('workers', 1)
+    time_budget = config_data[website].get('time_budget')
+    progressive = config_data[website].get('progressive', False)
+    logger.debug('Workers: {0}, time budget: {1}, progressive: {2}'.format(workers, time_budget, progressive))
+
+    return {
+        'website': website,
+        'feed': feed,
+        'cookies': cookies,
+        'output_file': output_file,
+        'extractor': extractor,
+        'workers': workers,
+        'time_budget': time_budget,
+        'progressive': progressive,
+    }
+
+
+def run_in_section(website, profile, function, *args):
+    """
+    Run a step of a section of the config.yml, counting its HTTP requests and profiling it with the section
+
+    :param website: name of the section
+    :type website: string
+    :param profile: profile of the section, None if profiling is disabled
+    :type profile: profiling.SectionProfile object
+    :param function: step to run, called with the remaining arguments
+    :type function: function
+    :return result: value returned by the function
+    """
+    with requestcounter.section(website):
+        if profile is not None:
+            return profile.call(function, *args)
+        return function(*args)
+
+
+def process_sections(logger, args, config_data, websites, feed_store=None):
+    """
+    Generate, or benchmark, the feeds of the given sections of the config.yml
+
+    The progressive feeds are all published with the summaries before fetching the articles of any section.
+
+    :param logger: custom logger
+    :type logger: logger object
+    :param args: command line arguments
+    :type args: argparse.Namespace object
+    :param config_data: content of the config.yml
+    :type config_data: dictionary
+    :param websites: sections of the config.yml to process
+    :type websites: list
+    :param feed_store: feeds served by --serve, None if not serving
+    :type feed_store: FeedStore object
+    """
+    run_deadline = None
+    if args.time_budget is not None:
+        run_deadline = time.monotonic() + args.time_budget
+
+    sections = [read_section(logger, config_data, website) for website in websites]
+
+    # Count the HTTP requests not made by fetch_html, they are not visible otherwise
+    all_additional_requests = list()
+    with contextlib.ExitStack() as stack:
+        request_counter = stack.enter_context(requestcounter.RequestCounter(logger))
+
+        # One cache for the whole run, closed at the end so that all the queued writes are committed
+        sq = None
+        if not args.cache_disabled:
+            sq = stack.enter_context(SQliteCacheHandler(logger))
+
+        # The profile of a progressive section covers its summaries too, published before the other sections run
+        profiles = dict()
+        if args.profile_enabled or args.profile_memory_enabled:
+            for section in sections:
+                profiles[section['website']] = profiling.SectionProfile(logger, section['website'], args.profile_dir,
+                                                                        args.profile_enabled,
+                                                                        args.profile_memory_enabled)
+
+        # Publish the cached articles and the summaries of every progressive feed first, so that none of them
+        # waits for the articles fetched for the sections before it
+        prepared_feeds = dict()
+        if not args.benchmark_enabled:
+            for section in sections:
+                if section['progressive']:
+                    website = section['website']
+                    prepared_feed = run_in_section(website, profiles.get(website), prepare_new_feed, logger, website,
+                                                   section['feed'], args.cache_disabled, sq)
+                    run_in_section(website, profiles.get(website), publish_summaries, logger, prepared_feed,
+                                   section['output_file'], feed_store)
+                    prepared_feeds[website] = prepared_feed
+
+        for section in sections:
+            website = section['website']
+
+            if args.benchmark_enabled:
+                run, run_args = benchmark_feed, (logger, website, section['feed'], section['cookies'],
+                                                 section['extractor'])
             else:
-                try:
-                    article.parse()
-                except Exception as e:
-                    logger.warning('Unable to parse the article for link {0}, error: {1}'.format(link, e))
-                    return None
-                else:
-                    return article.article_html
+                run, run_args = generate_new_feed, (logger, website, section['feed'], args.cache_disabled,
+                                                    section['cookies'], section['output_file'], section['extractor'],
+                                                    section['workers'], section['time_budget'], run_deadline,
+                                                    feed_store, section['progressive'], sq,
+                                                    prepared_feeds.get(website))
+
+            try:
+                run_in_section(website, profiles.get(website), run, *run_args)
+            finally:
+                if website in profiles:
+                    profiles[website].save()
+
+            # Requests made by the extraction engines, e.g. newspaper fetching the images
+            additional_requests = request_counter.pop(website)
+            all_additional_requests.extend(additional_requests)
+            if additional_requests:
+                logger.warning('{0}: {1} additional requests made outside fetch_html ({2})'.format(
+                    website, len(additional_requests), request_counter.summary(additional_requests)))
+
+        # The fetches abandoned because of a time budget can still be extracting while the next sections run
+        for section in sections:
+            late_requests = request_counter.pop(section['website'])
+            all_additional_requests.extend(late_requests)
+            if late_requests:
+                logger.warning('{0}: {1} additional requests made outside fetch_html by articles fetched after its '
+                               'time budget ({2})'.format(section['website'], len(late_requests),
+                                                          request_counter.summary(late_requests)))
+        all_additional_requests.extend(request_counter.pop())
+
+    if all_additional_requests:
+        logger.warning('{0} additional requests made outside fetch_html in this run'.format(
+            len(all_additional_requests)))
+    else:
+        logger.debug('No additional requests made outside fetch_html in this run')
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--debug', dest='debug_enabled', help='Enable debug mode', action='store_true')
     parser.add_argument('--disable-cache', dest='cache_disabled', help='Disable caching to SQLite', action='store_true')
+    parser.add_argument('--benchmark', dest='benchmark_enabled', action='store_true',
+                        help='Compare the extraction engine of each feed against newspaper, without writing the feeds')
+    parser.add_argument('--serve', dest='serve_enabled', action='store_true',
+                        help='Serve the generated feeds over HTTP, generating them again every --serve-interval')
+    parser.add_argument('--serve-address', dest='serve_address', default='',
+                        help='Address where to serve the feeds, default all the interfaces')
+    parser.add_argument('--serve-port', dest='serve_port', type=int, default=8080,
+                        help='Port where to serve the feeds, default 8080')
+    parser.add_argument('--serve-interval', dest='serve_interval', type=float, default=900, metavar='SECONDS',
+                        help='Seconds between two generations of the feeds when serving, default 900')
+    parser.add_argument('--time-budget', dest='time_budget', type=float, metavar='SECONDS',
+                        help='Stop fetching articles after this many seconds for the whole run, writing the feeds '
+                             'with the articles already available')
+    parser.add_argument('--only', dest='only_section', metavar='SECTION',
+                        help='Process only this section of the config.yml')
+    parser.add_argument('--profile', dest='profile_enabled', action='store_true',
+                        help='Profile each section with cProfile, writing pstats and collapsed stack files')
+    parser.add_argument('--profile-memory', dest='profile_memory_enabled', action='store_true',
+                        help='Profile the memory allocations of each section with tracemalloc')
+    parser.add_argument('--profile-dir', dest='profile_dir',
+                        default='{0}/config/profiles'.format(os.path.dirname(__file__)),
+                        help='Directory where to save the profile files, default config/profiles')
     args = parser.parse_args()
 
+    if args.serve_enabled and args.benchmark_enabled:
+        parser.error('--serve and --benchmark can not be used together')
+
     debug_enabled = args.debug_enabled
-    cache_disabled = args.cache_disabled
 
     logger = logging.getLogger('Custom logger')
     handler = logging.StreamHandler()
@@ -362,19 +897,35 @@ if __name__ == '__main__':
             sys.exit(1)
     logger.debug('config_data: {0}'.format(config_data))
 
-    for website in config_data.keys():
-        logger.debug('Reading configuration for {0}'.format(website))
-        feed = config_data[website]['feed']
-        logger.debug('Feed to parse: {0}'.format(feed))
-
-        if 'cookies' in config_data[website]:
-            cookies = config_data[website]['cookies']
-            logger.debug('Cookies: {0}'.format(cookies))
-        else:
-            cookies = dict()
-
-        output_file = config_data[website]['output_file']
-        logger.debug('Output file: {0}'.format(output_file))
+    websites = list(config_data.keys())
+    if args.only_section is not None:
+        if args.only_section not in config_data:
+            logger.error('Section {0} not found in the configuration file'.format(args.only_section))
+            sys.exit(1)
+        websites = [args.only_section]
 
+    if not args.serve_enabled:
+        process_sections(logger, args, config_data, websites)
+    else:
+        duplicates = feedserver.duplicate_feed_names([config_data[website]['output_file'] for website in websites])
+        for name, paths in duplicates.items():
+            logger.error('The output files {0} would all be served as /{1}, their names must be different'.format(
+                ', '.join(paths), name))
+        if duplicates:
+            sys.exit(1)
 
-        generate_new_feed(logger, website, feed, cache_disabled, cookies, output_file)
+        feed_store = feedserver.FeedStore(logger)
+        # Serve the feeds written by the previous run until they are generated again
+        for website in websites:
+            feed_store.publish_file(config_data[website]['output_file'])
+
+        server = feedserver.make_server(logger, feed_store, args.serve_address, args.serve_port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        while True:
+            try:
+                process_sections(logger, args, config_data, websites, feed_store)
+            except Exception as e:
+                # Keep serving the previous version of the feeds
+                logger.error('Unable to generate the feeds: {0}'.format(e))
+            time.sleep(args.serve_interval)
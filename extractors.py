@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+
+import difflib
+import re
+import time
+
+import lxml.etree
+import lxml.html
+
+
+# Tags without any text to show, removed from the whole page
+NON_CONTENT_TAGS = ['script', 'style', 'noscript']
+
+# Tags that never contain the body of an article, pruned by the readability heuristics
+UNLIKELY_TAGS = ['iframe', 'form', 'nav', 'header', 'footer', 'aside', 'button', 'svg', 'select', 'input', 'textarea']
+
+# Class or id hints used by the readability heuristics
+UNLIKELY_CANDIDATES = re.compile(r'comment|meta|footer|footnote|sidebar|share|social|related|promo|banner|cookie|'
+                                 r'popup|newsletter|subscribe|advert|sponsor|menu|breadcrumb', re.I)
+POSITIVE_CANDIDATES = re.compile(r'article|body|content|entry|main|page|post|story|text', re.I)
+
+# lxml refuses to parse a decoded string that declares its encoding, as XHTML pages do
+XML_DECLARATION = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+
+class ExtractorError(Exception):
+    pass
+
+
+class ContentExtractor:
+    """
+    Base class of the extraction engines used by get_readable_content
+    """
+
+    name = None
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def extract(self, link, html):
+        """
+        Extract the readable content from the HTML of a website page
+
+        :param link: link of the website page
+        :type link: string
+        :param html: HTML of the website page
+        :type html: string
+        :return content: readable content as HTML, None if it can't be extracted
+        :rtype content: string
+        """
+        raise NotImplementedError
+
+
+class NewspaperExtractor(ContentExtractor):
+    """
+    Extract the content with newspaper, slow but it works with any markup
+
+    newspaper's default configuration fetches the images to find the top image and memoizes the articles on disk,
+    both are disabled unless they are enabled for the feed in the config.yml
+    """
+
+    name = 'newspaper'
+
+    def __init__(self, logger, fetch_images=False, memoize_articles=False, follow_meta_refresh=False, language=None):
+        super().__init__(logger)
+        self.fetch_images = fetch_images
+        self.memoize_articles = memoize_articles
+        self.follow_meta_refresh = follow_meta_refresh
+        self.language = language
+        self.config = None
+
+    def newspaper_config(self):
+        """
+        Build the newspaper configuration once, it is shared by all the articles of the feed
+
+        :return config: newspaper configuration
+        :rtype config: newspaper.Config object
+        """
+        if self.config is None:
+            # newspaper has a very heavy import chain, import it only when this engine is used
+            from newspaper import Config
+
+            config = Config()
+            config.keep_article_html = True
+            config.fetch_images = self.fetch_images
+            config.memoize_articles = self.memoize_articles
+            config.follow_meta_refresh = self.follow_meta_refresh
+            if self.language is not None:
+                config.language = self.language
+            self.config = config
+
+        return self.config
+
+    def extract(self, link, html):
+        from newspaper import Article
+
+        article = Article(url=link, config=self.newspaper_config())
+
+        try:
+            article.download(input_html=html)
+        except Exception as e:
+            self.logger.warning('Unable to download the article for link {0}, error: {1}'.format(link, e))
+            return None
+        else:
+            if not article.html:
+                self.logger.debug('HTML content is empty for link: {0}'.format(link))
+                return None
+            else:
+                try:
+                    article.parse()
+                except Exception as e:
+                    self.logger.warning('Unable to parse the article for link {0}, error: {1}'.format(link, e))
+                    return None
+                else:
+                    return article.article_html
+
+
+class LxmlExtractor(ContentExtractor):
+    """
+    Extract the content with lxml, either with a CSS/XPath selector or with some readability heuristics
+    """
+
+    name = 'lxml'
+
+    def __init__(self, logger, css=None, xpath=None):
+        super().__init__(logger)
+        self.css = css
+        self.xpath = xpath
+
+        # Compile the selector only once, it is going to be used for all the entries of the feed
+        self.selector = None
+        if css and xpath:
+            raise ExtractorError('Only one between css and xpath can be set for the lxml extractor')
+        if css:
+            try:
+                from lxml.cssselect import CSSSelector, SelectorError
+            except ImportError:
+                raise ExtractorError('The module cssselect is required to use a CSS selector')
+            try:
+                self.selector = CSSSelector(css)
+            except SelectorError as e:
+                raise ExtractorError('Invalid CSS selector {0}: {1}'.format(css, e))
+        elif xpath:
+            try:
+                self.selector = lxml.etree.XPath(xpath)
+            except lxml.etree.XPathSyntaxError as e:
+                raise ExtractorError('Invalid XPath {0}: {1}'.format(xpath, e))
+
+    def extract(self, link, html):
+        if not html:
+            self.logger.debug('HTML content is empty for link: {0}'.format(link))
+            return None
+
+        try:
+            document = lxml.html.document_fromstring(XML_DECLARATION.sub('', html, count=1))
+        except (lxml.etree.ParserError, ValueError) as e:
+            self.logger.warning('Unable to parse the article for link {0}, error: {1}'.format(link, e))
+            return None
+
+        # Resolve relative links and images, as newspaper does
+        document.make_links_absolute(link, resolve_base_href=True, handle_failures='ignore')
+        lxml.etree.strip_elements(document, *NON_CONTENT_TAGS, with_tail=False)
+
+        if self.selector is not None:
+            nodes = [node for node in self.selector(document) if isinstance(node, lxml.html.HtmlElement)]
+            if not nodes:
+                self.logger.debug('Selector {0} did not match anything for link: {1}'.format(
+                    self.css or self.xpath, link))
+                return None
+        else:
+            node = self.readability(document)
+            if node is None:
+                self.logger.debug('Unable to find the article body for link: {0}'.format(link))
+                return None
+            nodes = [node]
+
+        return ''.join(lxml.html.tostring(node, encoding='unicode', with_tail=False) for node in nodes)
+
+    def readability(self, document):
+        """
+        Find the element containing the body of the article, scoring the parents of the paragraphs
+
+        :param document: parsed website page
+        :type document: lxml.html.HtmlElement
+        :return node: element with the highest score, None if there aren't paragraphs
+        :rtype node: lxml.html.HtmlElement
+        """
+        scores = dict()
+
+        for paragraph in document.iter('p', 'pre', 'td'):
+            text = paragraph.text_content().strip()
+            if len(text) < 25:
+                continue
+            # A form can wrap the whole page, e.g. ASP.NET WebForms, so its paragraphs are scored anyway
+            if any(ancestor.tag in UNLIKELY_TAGS and ancestor.tag != 'form'
+                   for ancestor in paragraph.iterancestors()):
+                continue
+
+            # One point for the paragraph, one for every comma and one for every 100 characters, up to 3
+            score = 1 + text.count(',') + min(len(text) // 100, 3)
+
+            parent = paragraph.getparent()
+            if parent is None:
+                continue
+            scores[parent] = scores.get(parent, self.initial_score(parent)) + score
+
+            grandparent = parent.getparent()
+            if grandparent is not None:
+                scores[grandparent] = scores.get(grandparent, self.initial_score(grandparent)) + score / 2.0
+
+        if not scores:
+            return None
+
+        # Penalise the elements that are mostly links, like menus and lists of related articles
+        best_node = None
+        best_score = None
+        for node, score in scores.items():
+            score = score * (1 - self.link_density(node))
+            if best_score is None or score > best_score:
+                best_node = node
+                best_score = score
+
+        # Prune what is left inside the article, its ancestors are not part of the content returned
+        for element in list(best_node.iterdescendants(*UNLIKELY_TAGS)):
+            element.drop_tree()
+
+        return best_node
+
+    @staticmethod
+    def initial_score(node):
+        hints = '{0} {1}'.format(node.get('class', ''), node.get('id', ''))
+        score = 0
+        if node.tag == 'article':
+            score += 10
+        if node.tag in UNLIKELY_TAGS:
+            score -= 25
+        if UNLIKELY_CANDIDATES.search(hints):
+            score -= 25
+        if POSITIVE_CANDIDATES.search(hints):
+            score += 25
+        return score
+
+    @staticmethod
+    def link_density(node):
+        text_length = len(node.text_content())
+        if text_length == 0:
+            return 1
+        link_length = sum(len(link.text_content()) for link in node.iter('a'))
+        return float(link_length) / text_length
+
+
+EXTRACTORS = {
+    NewspaperExtractor.name: NewspaperExtractor,
+    LxmlExtractor.name: LxmlExtractor,
+}
+
+
+def build_extractor(logger, extractor_config):
+    """
+    Instanciate the extraction engine selected for a feed in the config.yml
+
+    :param logger: custom logger
+    :type logger: logger object
+    :param extractor_config: extractor section of the feed provided in the config.yml, None for the default engine
+    :type extractor_config: dictionary
+    :return extractor: extraction engine
+    :rtype extractor: ContentExtractor object
+    """
+    if extractor_config is None:
+        extractor_config = dict()
+
+    options = dict(extractor_config)
+    engine = options.pop('engine', NewspaperExtractor.name)
+    if engine not in EXTRACTORS:
+        raise ExtractorError('Unknown extractor engine {0}, available engines: {1}'.format(
+            engine, ', '.join(sorted(EXTRACTORS))))
+
+    try:
+        return EXTRACTORS[engine](logger, **options)
+    except TypeError as e:
+        raise ExtractorError('Invalid options for the extractor engine {0}: {1}'.format(engine, e))
+
+
+def html_to_text(html):
+    """
+    Return the text of an HTML fragment, with the whitespaces normalized
+    """
+    if not html:
+        return ''
+    return ' '.join(lxml.html.fromstring(html).text_content().split())
+
+
+def benchmark_extractors(logger, reference, candidate, documents):
+    """
+    Run two extraction engines on the same website pages and compare speed and output
+
+    :param logger: custom logger
+    :type logger: logger object
+    :param reference: extraction engine used as reference, usually newspaper
+    :type reference: ContentExtractor object
+    :param candidate: extraction engine to compare against the reference
+    :type candidate: ContentExtractor object
+    :param documents: list of (link, html) already downloaded
+    :type documents: list
+    :return results: articles/sec of each engine and the average similarity of the text extracted
+    :rtype results: dictionary
+    """
+    results = dict()
+    outputs = dict()
+
+    for extractor in (reference, candidate):
+        outputs[extractor] = list()
+        if documents:
+            # Untimed run, so that lazy imports like newspaper's are not charged to the first article
+            extractor.extract(*documents[0])
+        start = time.perf_counter()
+        for link, html in documents:
+            outputs[extractor].append(extractor.extract(link, html))
+        elapsed = time.perf_counter() - start
+        results['{0}_articles_per_sec'.format(extractor.name)] = len(documents) / elapsed if elapsed else 0.0
+        logger.debug('{0} extracted {1} articles in {2:.3f}s'.format(extractor.name, len(documents), elapsed))
+
+    similarities = list()
+    for reference_output, candidate_output in zip(outputs[reference], outputs[candidate]):
+        reference_text = html_to_text(reference_output)
+        candidate_text = html_to_text(candidate_output)
+        if not reference_text and not candidate_text:
+            continue
+        similarities.append(difflib.SequenceMatcher(None, reference_text, candidate_text).ratio())
+
+    results['articles'] = len(documents)
+    results['similarity'] = sum(similarities) / len(similarities) if similarities else 0.0
+
+    return results
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+import collections
+import datetime
+import email.utils
+import gzip
+import hashlib
+import http.server
+import os
+import threading
+
+
+# Representation of a generated feed, ready to be served
+# Feeds are replaced as a whole, so a request never sees a mix of two generations
+ServedFeed = collections.namedtuple('ServedFeed', ['body', 'gzip_body', 'etag', 'gzip_etag', 'last_modified'])
+
+
+class FeedStore:
+    """
+    Keep in memory the last generated version of each feed
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.feeds = dict()
+        self.lock = threading.Lock()
+
+    def publish(self, name, body, last_modified=None):
+        """
+        Make a new version of a feed available, replacing the previous one
+
+        :param name: name of the feed in the URL, the basename of the output_file
+        :type name: string
+        :param body: content of the feed
+        :type body: bytes
+        :param last_modified: when the feed has been generated, now if not provided
+        :type last_modified: datetime object
+        """
+        digest = hashlib.sha256(body).hexdigest()[:32]
+
+        with self.lock:
+            previous = self.feeds.get(name)
+        if previous is not None and previous.etag == '"{0}"'.format(digest):
+            self.logger.debug('Feed {0} unchanged, keeping the version generated at {1}'.format(
+                name, previous.last_modified))
+            return
+
+        if last_modified is None:
+            last_modified = datetime.datetime.now(datetime.timezone.utc)
+        # HTTP dates have a resolution of one second
+        last_modified = last_modified.replace(microsecond=0)
+
+        # Compress once here instead of on every request. mtime=0 keeps the gzip body stable for the same content
+        served_feed = ServedFeed(body=body,
+                                 gzip_body=gzip.compress(body, compresslevel=9, mtime=0),
+                                 etag='"{0}"'.format(digest),
+                                 gzip_etag='"{0}-gzip"'.format(digest),
+                                 last_modified=last_modified)
+
+        with self.lock:
+            self.feeds[name] = served_feed
+        self.logger.debug('Feed {0} published, ETag {1}'.format(name, served_feed.etag))
+
+    def publish_file(self, path):
+        """
+        Make available a feed written by a previous run, until it is generated again
+
+        :param path: full path of the output_file
+        :type path: string
+        """
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+            mtime = os.path.getmtime(path)
+        except OSError as error:
+            self.logger.debug('Unable to read the previous version of {0}: {1}'.format(path, error))
+            return
+
+        self.publish(feed_name(path), body,
+                     datetime.datetime.fromtimestamp(mtime, datetime.timezone.utc))
+
+    def get(self, name):
+        with self.lock:
+            return self.feeds.get(name)
+
+
+def feed_name(path):
+    """
+    Name of a feed in the URL, the basename of its output_file
+    """
+    return os.path.basename(path)
+
+
+def duplicate_feed_names(paths):
+    """
+    Find the output files that would be served with the same name, replacing each other
+
+    :param paths: full paths of the output_file of each section
+    :type paths: list
+    :return duplicates: output files for each name used more than once
+    :rtype duplicates: dictionary
+    """
+    names = dict()
+    for path in paths:
+        names.setdefault(feed_name(path), list()).append(path)
+    return {name: paths for name, paths in names.items() if len(paths) > 1}
+
+
+class FeedRequestHandler(http.server.BaseHTTPRequestHandler):
+    # Set by make_server
+    feed_store = None
+    logger = None
+
+    def do_GET(self):
+        self.send_feed(include_body=True)
+
+    def do_HEAD(self):
+        self.send_feed(include_body=False)
+
+    def send_feed(self, include_body):
+        served_feed = self.feed_store.get(self.path.split('?', 1)[0].lstrip('/'))
+        if served_feed is None:
+            self.send_error(404)
+            return
+
+        if self.accepts_gzip():
+            body, etag = served_feed.gzip_body, served_feed.gzip_etag
+        else:
+            body, etag = served_feed.body, served_feed.etag
+
+        if self.is_not_modified(etag, served_feed.last_modified):
+            self.send_response(304)
+            self.send_feed_headers(etag, served_feed.last_modified)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        if body is served_feed.gzip_body:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_feed_headers(etag, served_feed.last_modified)
+        self.end_headers()
+
+        if include_body:
+            self.wfile.write(body)
+
+    def send_feed_headers(self, etag, last_modified):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', email.utils.format_datetime(last_modified, usegmt=True))
+        self.send_header('Vary', 'Accept-Encoding')
+
+    def accepts_gzip(self):
+        for coding in self.headers.get('Accept-Encoding', '').split(','):
+            name, _, params = coding.partition(';')
+            if name.strip().lower() in ('gzip', '*'):
+                quality = params.strip().lower()
+                return quality not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+        return False
+
+    def is_not_modified(self, etag, last_modified):
+        # If-None-Match takes precedence over If-Modified-Since, RFC 7232 section 6
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            if if_none_match.strip() == '*':
+                return True
+            # Weak comparison, as required for If-None-Match
+            etags = [tag.strip() for tag in if_none_match.split(',')]
+            return etag in [tag[2:] if tag.startswith('W/') else tag for tag in etags]
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=datetime.timezone.utc)
+            return last_modified <= since
+
+        return False
+
+    def log_message(self, format, *args):
+        self.logger.debug('{0} - {1}'.format(self.address_string(), format % args))
+
+
+def make_server(logger, feed_store, address, port):
+    """
+    Create the HTTP server answering with the feeds in the FeedStore, each request is handled in its own thread
+
+    :param logger: custom logger
+    :type logger: logger object
+    :param feed_store: feeds to serve
+    :type feed_store: FeedStore object
+    :param address: address to listen on, empty for all the interfaces
+    :type address: string
+    :param port: port to listen on
+    :type port: integer
+    :return server: HTTP server, to start with serve_forever()
+    :rtype server: http.server.ThreadingHTTPServer object
+    """
+    handler = type('BoundFeedRequestHandler', (FeedRequestHandler,), {'feed_store': feed_store, 'logger': logger})
+    server = http.server.ThreadingHTTPServer((address, port), handler)
+    server.daemon_threads = True
+    logger.debug('Serving the feeds on {0}:{1}'.format(address or '*', port))
+    return server
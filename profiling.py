@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+import cProfile
+import linecache
+import os
+import pstats
+import re
+import threading
+import tracemalloc
+
+
+# Number of hot functions and allocation sites printed at the end of each profiled section
+TOP_ENTRIES = 15
+
+# cProfile only records the thread that started it, so while profile_call is running with cProfile the worker
+# threads profile themselves through call() and their profiles are collected here, to be merged at the end
+_thread_profiles = None
+_thread_profiles_lock = threading.Lock()
+
+
+def call(function, *args, **kwargs):
+    """
+    Call a function in a worker thread, profiling it if profile_call is running with cProfile
+
+    :param function: function to call with the remaining arguments
+    :type function: function
+    :return result: value returned by the function
+    """
+    thread_profiles = _thread_profiles
+    if thread_profiles is None:
+        return function(*args, **kwargs)
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Since Python 3.12 only one cProfile can be active at a time, and it records all the threads
+        return function(*args, **kwargs)
+
+    try:
+        return function(*args, **kwargs)
+    finally:
+        profiler.disable()
+        with _thread_profiles_lock:
+            thread_profiles.append(profiler)
+
+
+def profile_call(logger, section, output_dir, cpu_enabled, memory_enabled, function, *args, **kwargs):
+    """
+    Run a function under cProfile and/or tracemalloc, save the profiles and print a summary
+
+    :param logger: custom logger
+    :type logger: logger object
+    :param section: name of the section in the config.yml, used to name the profile files
+    :type section: string
+    :param output_dir: directory where to save the profile files
+    :type output_dir: string
+    :param cpu_enabled: boolean if cProfile is enabled
+    :type cpu_enabled: boolean
+    :param memory_enabled: boolean if tracemalloc is enabled
+    :type memory_enabled: boolean
+    :param function: function to profile, called with the remaining arguments
+    :type function: function
+    :return result: value returned by the function
+    """
+    profile = SectionProfile(logger, section, output_dir, cpu_enabled, memory_enabled)
+    try:
+        return profile.call(function, *args, **kwargs)
+    finally:
+        profile.save()
+
+
+class SectionProfile:
+    """
+    Profile of a section of the config.yml, collected over one or more calls and saved at the end
+
+    A progressive feed is published with the summaries before the other sections run, and completed later on, both
+    calls end up in the same profile files.
+    """
+
+    def __init__(self, logger, section, output_dir, cpu_enabled, memory_enabled):
+        self.logger = logger
+        self.section = section
+        self.output_dir = output_dir
+        self.cpu_enabled = cpu_enabled
+        self.memory_enabled = memory_enabled
+
+        # cProfile keeps adding to the same statistics every time it is enabled again
+        self.profiler = cProfile.Profile() if cpu_enabled else None
+        self.thread_profiles = list()
+        self.snapshots = list()
+        self.peak = 0
+
+    def call(self, function, *args, **kwargs):
+        """
+        Run a function under cProfile and/or tracemalloc, adding it to the profile of the section
+
+        :param function: function to profile, called with the remaining arguments
+        :type function: function
+        :return result: value returned by the function
+        """
+        global _thread_profiles
+
+        if self.profiler is not None:
+            _thread_profiles = list()
+        if self.memory_enabled:
+            tracemalloc.start(25)
+
+        try:
+            if self.profiler is not None:
+                return self.profiler.runcall(function, *args, **kwargs)
+            return function(*args, **kwargs)
+        finally:
+            if self.memory_enabled:
+                self.snapshots.append(tracemalloc.take_snapshot())
+                self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+
+            if self.profiler is not None:
+                with _thread_profiles_lock:
+                    # Profiles of the workers still running, e.g. fetches abandoned because of the time budget, are
+                    # lost
+                    thread_profiles, _thread_profiles = _thread_profiles, None
+                self.thread_profiles.extend(thread_profiles)
+
+    def save(self):
+        """
+        Save the profile files of the section and print a summary
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        file_prefix = os.path.join(self.output_dir, re.sub(r'[^\w.-]', '_', self.section))
+
+        if self.profiler is not None:
+            stats = pstats.Stats(self.profiler)
+            for thread_profile in self.thread_profiles:
+                stats.add(thread_profile)
+            stats.dump_stats('{0}.pstats'.format(file_prefix))
+            write_collapsed_stacks(stats, '{0}.collapsed'.format(file_prefix))
+            self.logger.debug('CPU profile for {0} written to {1}.pstats and {1}.collapsed'.format(
+                self.section, file_prefix))
+
+            print('Top {0} hot functions for {1}:'.format(TOP_ENTRIES, self.section))
+            stats.sort_stats('tottime').print_stats(TOP_ENTRIES)
+
+        if self.snapshots:
+            snapshot = merge_snapshots(self.snapshots).filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ])
+            snapshot.dump('{0}.tracemalloc'.format(file_prefix))
+            self.logger.debug('Memory profile for {0} written to {1}.tracemalloc'.format(self.section, file_prefix))
+
+            print('Top {0} allocation sites for {1}, peak {2:.1f} KiB:'.format(TOP_ENTRIES, self.section,
+                                                                            self.peak / 1024))
+            for statistic in snapshot.statistics('lineno')[:TOP_ENTRIES]:
+                frame = statistic.traceback[0]
+                print('  {0}:{1}: {2:.1f} KiB in {3} blocks'.format(frame.filename, frame.lineno,
+                                                                   statistic.size / 1024, statistic.count))
+                line = linecache.getline(frame.filename, frame.lineno).strip()
+                if line:
+                    print('    {0}'.format(line))
+
+
+def merge_snapshots(snapshots):
+    """
+    Merge the tracemalloc snapshots taken at the end of each call of a section
+
+    tracemalloc has no public way to combine snapshots, the traces are rebuilt as Snapshot.filter_traces does
+
+    :param snapshots: snapshots to merge
+    :type snapshots: list
+    :return snapshot: snapshot with the traces of all the snapshots
+    :rtype snapshot: tracemalloc.Snapshot object
+    """
+    if len(snapshots) == 1:
+        return snapshots[0]
+    traces = [trace._trace for snapshot in snapshots for trace in snapshot.traces]
+    return tracemalloc.Snapshot(traces, max(snapshot.traceback_limit for snapshot in snapshots))
+
+
+def write_collapsed_stacks(stats, path):
+    """
+    Write the CPU profile in the collapsed stack format used by flamegraph.pl and speedscope
+
+    cProfile doesn't record full stacks, so the stack of each function is rebuilt following its most expensive
+    caller up to the root. The weight of each stack is the time spent in the function itself, in microseconds.
+
+    :param stats: CPU profile
+    :type stats: pstats.Stats object
+    :param path: full path of the file to write
+    :type path: string
+    """
+    # stats.stats maps each function to (primitive calls, total calls, tottime, cumtime, callers)
+    # and each caller to (primitive calls, total calls, tottime, cumtime) spent on behalf of that caller
+    with open(path, 'w') as f:
+        for function, (_, _, tottime, _, callers) in stats.stats.items():
+            weight = int(tottime * 1000000)
+            if weight == 0:
+                continue
+
+            stack = [function]
+            seen = {function}
+            while callers:
+                caller = max(callers, key=lambda item: callers[item][3])
+                if caller in seen:
+                    break
+                stack.append(caller)
+                seen.add(caller)
+                callers = stats.stats[caller][4] if caller in stats.stats else None
+
+            f.write('{0} {1}\n'.format(';'.join(function_label(frame) for frame in reversed(stack)), weight))
+
+
+def function_label(function):
+    filename, lineno, name = function
+    if filename == '~':
+        # Built-in functions, like {method 'execute' of 'sqlite3.Connection' objects}
+        return name
+    return '{0}:{1}:{2}'.format(os.path.basename(filename), lineno, name)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+import contextlib
+import threading
+from urllib.parse import urlsplit
+
+import requests
+
+
+# Set while a thread is inside fetch_html, the requests made there are the expected ones, and to the section of the
+# config.yml the thread is working for
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def own_requests():
+    """
+    Mark the HTTP requests made by the current thread inside this block as made by blasterfeed itself
+    """
+    previous = getattr(_local, 'own', False)
+    _local.own = True
+    try:
+        yield
+    finally:
+        _local.own = previous
+
+
+@contextlib.contextmanager
+def section(name):
+    """
+    Attribute the HTTP requests made by the current thread inside this block to a section of the config.yml
+    """
+    previous = getattr(_local, 'section', None)
+    _local.section = name
+    try:
+        yield
+    finally:
+        _local.section = previous
+
+
+def current_section():
+    return getattr(_local, 'section', None)
+
+
+def call(section_name, function, *args, **kwargs):
+    """
+    Call a function in a worker thread, attributing its HTTP requests to the section that submitted it
+
+    :param section_name: section of the config.yml, usually current_section() of the submitting thread
+    :type section_name: string
+    :param function: function to call with the remaining arguments
+    :type function: function
+    :return result: value returned by the function
+    """
+    with section(section_name):
+        return function(*args, **kwargs)
+
+
+class RequestCounter:
+    """
+    Record the HTTP requests made through requests outside own_requests(), e.g. by newspaper fetching images
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.lock = threading.Lock()
+        # URLs requested for each section of the config.yml
+        self.requests = dict()
+        self.original_send = None
+
+    def __enter__(self):
+        original_send = requests.Session.send
+        counter = self
+
+        def send(session, request, **kwargs):
+            if not getattr(_local, 'own', False):
+                counter.record(request.method, request.url)
+            return original_send(session, request, **kwargs)
+
+        self.original_send = original_send
+        requests.Session.send = send
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        requests.Session.send = self.original_send
+
+    def record(self, method, url):
+        name = current_section()
+        self.logger.debug('Additional request for {0}: {1} {2}'.format(name, method, url))
+        with self.lock:
+            self.requests.setdefault(name, list()).append(url)
+
+    def pop(self, name=None):
+        """
+        Return the URLs requested for a section since the last call and start counting again
+
+        :param name: section of the config.yml, None for the requests made outside any section
+        :type name: string
+        :return requests: URLs of the additional requests
+        :rtype requests: list
+        """
+        with self.lock:
+            return self.requests.pop(name, list())
+
+    @staticmethod
+    def summary(urls):
+        """
+        Describe a list of additional requests, grouped by host
+
+        :param urls: URLs of the additional requests
+        :type urls: list
+        :return summary: number of requests for each host, the busiest first
+        :rtype summary: string
+        """
+        hosts = dict()
+        for url in urls:
+            host = urlsplit(url).netloc
+            hosts[host] = hosts.get(host, 0) + 1
+        return ', '.join('{0}: {1}'.format(host, count)
+                         for host, count in sorted(hosts.items(), key=lambda item: item[1], reverse=True))
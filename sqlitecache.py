@@ -1,13 +1,39 @@
 #!/usr/bin/env python
 
+import queue
 import sqlite3
 import os
+import threading
+
+import profiling
+
+
+# Put in the queue by close() to stop the writer thread
+STOP_WRITER = None
 
 
 class SQliteCacheHandler:
-    def __init__(self, logger):
+    """
+    Cache of the articles, safe to share between threads
+
+    Each thread reads with its own connection, WAL allows concurrent readers. Inserts and cleans are queued and
+    executed by a single writer thread, grouping everything already queued in one transaction.
+    """
+
+    def __init__(self, logger, path=None, busy_timeout=30000):
         self.logger = logger
-        self.conn = sqlite3.connect('{0}/config/blasterfeed-cache.sqlite3'.format(os.path.dirname(__file__)))
+        if path is None:
+            path = '{0}/config/blasterfeed-cache.sqlite3'.format(os.path.dirname(__file__))
+        self.path = path
+        # Milliseconds to wait for the lock held by another process before failing with "database is locked"
+        self.busy_timeout = busy_timeout
+
+        self.local = threading.local()
+        self.connections = list()
+        self.connections_lock = threading.Lock()
+        self.closed = False
+
+        self.conn = self.connect()
         self.logger.debug('SQLite3 connection object: {0}'.format(self.conn))
         self.c = self.conn.cursor()
         # Enable WAL journaling
@@ -22,38 +48,115 @@ class SQliteCacheHandler:
         self.c.execute('''CREATE INDEX IF NOT EXISTS item_link_index ON data (item_link)''')
         self.conn.commit()
 
-    def search(self, item_link):
-        self.query = self.conn.execute('SELECT * FROM data WHERE item_link=?', (item_link,))
-        self.result = self.query.fetchone()
+        # From now on self.conn is used only by the writer thread
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.write, name='SQliteCacheWriter', daemon=True)
+        self.writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def connect(self):
+        # check_same_thread=False because close() can close the connections of the other threads
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000.0, check_same_thread=False)
+        conn.execute('PRAGMA busy_timeout = {0:d}'.format(self.busy_timeout))
+        return conn
 
-        return self.result
+    def reader(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.connect()
+            self.local.conn = conn
+            with self.connections_lock:
+                self.connections.append(conn)
+            self.logger.debug('SQLite3 read connection object for {0}: {1}'.format(
+                threading.current_thread().name, conn))
+        return conn
+
+    def search(self, item_link):
+        return self.reader().execute('SELECT * FROM data WHERE item_link=?', (item_link,)).fetchone()
 
     def insert(self, feed_link, item_link, date, content):
-        self.query = self.conn.execute('INSERT INTO data VALUES (NULL, ?, ?, ?, ?)', (feed_link, item_link, date,
-                                                                                      content))
-        self.conn.commit()
+        self.enqueue('INSERT INTO data VALUES (NULL, ?, ?, ?, ?)', (feed_link, item_link, date, content))
 
     def clean(self, feed_link, list_of_items_links):
         # Unfortunately I can't pass python list to the execute, so I have to build the query first
         # http://stackoverflow.com/questions/5766230/select-from-sqlite-table-where-rowid-in-list-using-python-sqlite3-db-api-2-0
-        sql = 'DELETE FROM data WHERE feed_link = \'{0}\' AND item_link NOT IN ({seq})'.format(
-            feed_link,
+        sql = 'DELETE FROM data WHERE feed_link = ? AND item_link NOT IN ({seq})'.format(
             seq=', '.join(['?']*len(list_of_items_links))
         )
 
-        self.query = self.conn.execute(sql, list_of_items_links)
-        self.conn.commit()
-        self.logger.debug('SQLite cleaned for: {0}'.format(feed_link))
+        self.enqueue(sql, [feed_link] + list(list_of_items_links))
+        self.logger.debug('SQLite clean queued for: {0}'.format(feed_link))
+
+    def enqueue(self, sql, parameters):
+        if self.closed:
+            # e.g. a fetch abandoned because of the time budget that completes at the end of the run
+            self.logger.debug('SQLite cache already closed, discarding: {0}'.format(sql))
+            return
+        self.queue.put((sql, parameters))
+
+    def flush(self):
+        """
+        Wait until all the queued inserts and cleans have been written
+        """
+        self.queue.join()
+
+    def write(self):
+        stop = False
+        while not stop:
+            operations = [self.queue.get()]
+            # Group in the same transaction everything that is already waiting
+            while True:
+                try:
+                    operations.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            received = len(operations)
+            if STOP_WRITER in operations:
+                stop = True
+                operations = operations[:operations.index(STOP_WRITER)]
+
+            profiling.call(self.commit, operations)
+
+            for _ in range(received):
+                self.queue.task_done()
+
+    def commit(self, operations):
+        try:
+            # The connection as context manager commits, or rolls back on errors
+            with self.conn:
+                for sql, parameters in operations:
+                    self.conn.execute(sql, parameters)
+            self.logger.debug('SQLite transaction committed with {0} operations'.format(len(operations)))
+        except sqlite3.Error as error:
+            self.logger.error('Error writing to DB, {0} operations discarded. Error: {1}'.format(
+                len(operations), error))
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        # Let the writer thread drain the queue
+        self.queue.put(STOP_WRITER)
+        self.writer.join()
 
-    def __exit__(self):
         try:
             self.c.close()
         except sqlite3.ProgrammingError as error:
             self.logger.error('Error closing cursor to DB. Connection object: {conn}, '
                               'Error: {error}'.format(conn=self.conn, error=error))
 
-        try:
-            self.conn.close()
-        except sqlite3.OperationalError as error:
-            self.logger.error('Error closing connection to DB. Connection object: {conn}, '
-                              'Error: {error}'.format(conn=self.conn, error=error))
+        with self.connections_lock:
+            connections, self.connections = [self.conn] + self.connections, list()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.OperationalError as error:
+                self.logger.error('Error closing connection to DB. Connection object: {conn}, '
+                                  'Error: {error}'.format(conn=conn, error=error))
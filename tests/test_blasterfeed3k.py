@@ -1,10 +1,42 @@
 import unittest2
+import argparse
 import logging
+import os
+import pstats
+import shutil
+import tempfile
+import time
+from unittest import mock
 import datetime
 import dateutil
 import my_timezones
 from feedgen.feed import FeedGenerator
 from blasterfeed3k import *
+from sqlitecache import SQliteCacheHandler
+
+
+def fake_readable_content(logger, cookies, link, extractor=None, deadline=None):
+    # The articles with slow in the link take longer than the time budgets used by the tests
+    time.sleep(1 if 'slow' in link or link.endswith('/xml') else 0.05)
+    return 'Full content of {0}'.format(link)
+
+
+class FakeCache:
+    def __init__(self, rows):
+        self.rows = rows
+        self.inserted = list()
+        self.cleaned = list()
+
+    def search(self, item_link):
+        if item_link in self.rows:
+            return (1, 'https://example.com/', item_link, '2018-11-04', self.rows[item_link])
+        return None
+
+    def insert(self, feed_link, item_link, date, content):
+        self.inserted.append(item_link)
+
+    def clean(self, feed_link, list_of_items_links):
+        self.cleaned.append((feed_link, list_of_items_links))
 
 
 class Test001SvcTests(unittest2.TestCase):
@@ -106,6 +138,231 @@ class Test001SvcTests(unittest2.TestCase):
 
         self.assertItemsEqual(result_fg.rss_str(), expected_fg.rss_str())
 
+    def test_006_generate_new_feed_deadline_passed(self):
+        directory = tempfile.mkdtemp()
+        output_file = os.path.join(directory, 'feed.xml')
+        cached_link = 'https://www.w3schools.com/xml/xml_rss.asp'
+        not_cached_link = 'https://www.w3schools.com/xml'
+        sq = FakeCache({cached_link: 'Cached content'})
+
+        try:
+            with mock.patch('blasterfeed3k.get_readable_content', side_effect=fake_readable_content) as fetch:
+                generate_new_feed(self.logger, 'example.com', 'tests/sample_feed.rss', False, dict(), output_file,
+                                  run_deadline=time.monotonic() - 1, sq=sq)
+
+            with open(output_file, 'r') as f:
+                generated_feed = f.read()
+        finally:
+            shutil.rmtree(directory)
+
+        fetch.assert_not_called()
+        self.assertIn('Cached content', generated_feed)
+        self.assertEqual(sq.inserted, [])
+        self.assertEqual(sq.cleaned, [('https://example.com/', [cached_link, not_cached_link])])
+
+    def test_007_build_new_feed_progressive(self):
+        new_feed_elements = {
+            'feed_title': 'Test title',
+            'feed_link': 'https://example.com/',
+            'feed_description': 'Test description'
+        }
+        new_feed_entries = [
+            {'entry_title': 'Cached', 'entry_link': 'https://example.com/cached', 'entry_summary': 'Summary 1'},
+            {'entry_title': 'Not cached', 'entry_link': 'https://example.com/not-cached', 'entry_summary': 'Summary 2'},
+            {'entry_title': 'No summary', 'entry_link': 'https://example.com/no-summary'}
+        ]
+        contents = {'https://example.com/cached': 'Full content'}
+
+        fg = build_new_feed(self.logger, new_feed_elements, new_feed_entries, contents)
+        progressive_fg = build_new_feed(self.logger, new_feed_elements, new_feed_entries, contents, progressive=True)
+
+        self.assertEqual([fe.content()['content'] for fe in fg.entry()], ['Full content'])
+        self.assertEqual(sorted(fe.content()['content'] for fe in progressive_fg.entry()),
+                         ['Full content', 'Summary 2'])
+
+    def test_008_profile_fetch_contents(self):
+        directory = tempfile.mkdtemp()
+        extractor = extractors.LxmlExtractor(self.logger)
+        html = '<html><body><div><p>A paragraph long enough for the readability heuristics.</p></div></body></html>'
+
+        try:
+            with mock.patch('blasterfeed3k.fetch_html', return_value=html):
+                contents = profiling.profile_call(self.logger, 'example.com', directory, True, False, fetch_contents,
+                                                  self.logger, True, None, 'https://example.com/',
+                                                  ['https://example.com/1'], dict(), extractor)
+            stats = pstats.Stats(os.path.join(directory, 'example.com.pstats'))
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertIn('A paragraph long enough', contents['https://example.com/1'])
+        # The extraction runs in a worker thread, it must be in the profile anyway
+        self.assertIn('readability', [name for (_, _, name) in stats.stats])
+
+    def test_009_fetch_contents_deadline_during_fetches(self):
+        entries_links = ['https://example.com/fast-1', 'https://example.com/slow', 'https://example.com/fast-2']
+
+        start = time.monotonic()
+        with mock.patch('blasterfeed3k.get_readable_content', side_effect=fake_readable_content):
+            contents = fetch_contents(self.logger, True, None, 'https://example.com/', entries_links, dict(),
+                                      workers=3, deadline=time.monotonic() + 0.5)
+
+        self.assertLess(time.monotonic() - start, 0.9)
+        self.assertEqual(contents, {'https://example.com/fast-1': 'Full content of https://example.com/fast-1',
+                                    'https://example.com/fast-2': 'Full content of https://example.com/fast-2'})
+
+    def test_010_generate_new_feed_keeps_cache_of_skipped_entries(self):
+        directory = tempfile.mkdtemp()
+        output_file = os.path.join(directory, 'feed.xml')
+        fast_link = 'https://www.w3schools.com/xml/xml_rss.asp'
+        slow_link = 'https://www.w3schools.com/xml'
+        old_link = 'https://www.w3schools.com/old'
+
+        try:
+            with SQliteCacheHandler(self.logger, os.path.join(directory, 'cache.sqlite3')) as sq:
+                sq.insert('https://example.com/', old_link, '2018-11-04', 'Old content')
+                sq.flush()
+
+                with mock.patch('blasterfeed3k.get_readable_content', side_effect=fake_readable_content), \
+                        mock.patch.object(sq, 'clean', wraps=sq.clean) as clean:
+                    generate_new_feed(self.logger, 'example.com', 'tests/sample_feed.rss', False, dict(), output_file,
+                                      workers=2, time_budget=0.5, sq=sq)
+
+                    # The skipped entry is in the list of the entries to keep
+                    clean.assert_called_once_with('https://example.com/', [fast_link, slow_link])
+
+                    # Let the abandoned fetch complete, it is still stored in cache for the next run
+                    time.sleep(1)
+                    sq.flush()
+
+                self.assertIsNone(sq.search(old_link))
+                self.assertEqual(sq.search(fast_link)[4], 'Full content of {0}'.format(fast_link))
+                self.assertEqual(sq.search(slow_link)[4], 'Full content of {0}'.format(slow_link))
+
+            with open(output_file, 'r') as f:
+                generated_feed = f.read()
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertIn('Full content of {0}'.format(fast_link), generated_feed)
+        self.assertEqual(generated_feed.count('Full content of'), 1)
+
+    def test_011_same_etag_for_unchanged_feed(self):
+        new_feed_elements = parse_the_feed(self.logger, 'example.com', 'tests/sample_feed.rss')
+        new_feed_entries = [parse_an_entry(self.logger, entry) for entry in new_feed_elements['feed_entries']]
+        contents = {new_feed_entry['entry_link']: 'Full content' for new_feed_entry in new_feed_entries}
+        feed_store = feedserver.FeedStore(self.logger)
+
+        feed_store.publish('feed.xml', build_new_feed(self.logger, new_feed_elements, new_feed_entries,
+                                                      contents).rss_str())
+        first_generation = feed_store.get('feed.xml')
+        # lastBuildDate has a resolution of one second
+        time.sleep(1.1)
+        feed_store.publish('feed.xml', build_new_feed(self.logger, new_feed_elements, new_feed_entries,
+                                                      contents).rss_str())
+
+        self.assertIs(feed_store.get('feed.xml'), first_generation)
+
+    def test_012_process_sections_publishes_all_summaries_first(self):
+        directory = tempfile.mkdtemp()
+        output_files = [os.path.join(directory, 'first.xml'), os.path.join(directory, 'second.xml')]
+        config_data = {
+            'first': {'feed': 'tests/sample_feed.rss', 'output_file': output_files[0], 'progressive': True},
+            'second': {'feed': 'tests/sample_feed.rss', 'output_file': output_files[1], 'progressive': True},
+        }
+        args = argparse.Namespace(cache_disabled=True, benchmark_enabled=False, time_budget=None,
+                                  profile_enabled=False, profile_memory_enabled=False)
+        published_before_fetching = list()
+
+        def check_published(logger, cookies, link, extractor=None, deadline=None):
+            published_before_fetching.append(all(os.path.exists(output_file) for output_file in output_files))
+            return 'Full content of {0}'.format(link)
+
+        try:
+            with mock.patch('blasterfeed3k.get_readable_content', side_effect=check_published):
+                process_sections(self.logger, args, config_data, ['first', 'second'])
+
+            generated_feeds = list()
+            for output_file in output_files:
+                with open(output_file, 'r') as f:
+                    generated_feeds.append(f.read())
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(published_before_fetching, [True] * 4)
+        for generated_feed in generated_feeds:
+            self.assertEqual(generated_feed.count('Full content of'), 2)
+
+    def test_013_generate_new_feed_opens_its_own_cache(self):
+        directory = tempfile.mkdtemp()
+        cache_file = os.path.join(directory, 'cache.sqlite3')
+        link = 'https://www.w3schools.com/xml/xml_rss.asp'
+
+        def cache_in_directory(logger):
+            return SQliteCacheHandler(logger, cache_file)
+
+        try:
+            with mock.patch('blasterfeed3k.get_readable_content', side_effect=fake_readable_content), \
+                    mock.patch('blasterfeed3k.SQliteCacheHandler', side_effect=cache_in_directory):
+                generate_new_feed(self.logger, 'example.com', 'tests/sample_feed.rss', False, dict(),
+                                  os.path.join(directory, 'feed.xml'), workers=2)
+
+            # The cache has been closed, with the queued inserts committed
+            with SQliteCacheHandler(self.logger, cache_file) as sq:
+                self.assertEqual(sq.search(link)[4], 'Full content of {0}'.format(link))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_014_process_sections_profiles_the_summaries(self):
+        directory = tempfile.mkdtemp()
+        config_data = {
+            'progressive': {'feed': 'tests/sample_feed.rss', 'output_file': os.path.join(directory, 'feed.xml'),
+                            'progressive': True},
+        }
+        args = argparse.Namespace(cache_disabled=True, benchmark_enabled=False, time_budget=None,
+                                  profile_enabled=True, profile_memory_enabled=False, profile_dir=directory)
+
+        try:
+            with mock.patch('blasterfeed3k.get_readable_content', side_effect=fake_readable_content):
+                process_sections(self.logger, args, config_data, ['progressive'])
+
+            function_names = [name for (_, _, name) in pstats.Stats(os.path.join(directory,
+                                                                                 'progressive.pstats')).stats]
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertIn('parse_the_feed', function_names)
+        self.assertIn('publish_summaries', function_names)
+        self.assertIn('fetch_contents', function_names)
+
+    def test_015_same_etag_for_unchanged_feed_without_dates(self):
+        directory = tempfile.mkdtemp()
+        output_file = os.path.join(directory, 'feed.xml')
+        new_feed_elements = parse_the_feed(self.logger, 'example.com', 'tests/sample_feed.rss')
+        del new_feed_elements['feed_pubdate']
+        new_feed_entries = [parse_an_entry(self.logger, entry) for entry in new_feed_elements['feed_entries']]
+        for new_feed_entry in new_feed_entries:
+            new_feed_entry.pop('entry_pubdate', None)
+        contents = {new_feed_entry['entry_link']: 'Full content' for new_feed_entry in new_feed_entries}
+        feed_store = feedserver.FeedStore(self.logger)
+
+        try:
+            write_feed(self.logger, build_new_feed(self.logger, new_feed_elements, new_feed_entries, contents),
+                       output_file, feed_store)
+            first_generation = feed_store.get('feed.xml')
+            # lastBuildDate has a resolution of one second
+            time.sleep(1.1)
+            write_feed(self.logger, build_new_feed(self.logger, new_feed_elements, new_feed_entries, contents),
+                       output_file, feed_store)
+
+            with open(output_file, 'rb') as f:
+                written = f.read()
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertIn(b'<lastBuildDate>', written)
+        self.assertEqual(written, first_generation.body)
+        self.assertIs(feed_store.get('feed.xml'), first_generation)
+
 
 if __name__ == '__main__':
     unittest2.main()
\ No newline at end of file
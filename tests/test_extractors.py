@@ -0,0 +1,147 @@
+import unittest2
+import logging
+from extractors import *
+
+
+SAMPLE_PAGE = '''<html>
+<head><title>Page title</title><script>var tracking = true;</script></head>
+<body>
+<nav><a href="/">Home</a> <a href="/news">News</a></nav>
+<div class="sidebar"><p>Subscribe to our newsletter, it is free, it is weekly, it is great.</p></div>
+<div class="article-body">
+<p>First paragraph of the article, long enough to be considered by the heuristics.</p>
+<p>Second paragraph of the article, with some commas, a few of them, to score it higher.</p>
+<img src="/image.jpg">
+</div>
+<footer><p>Copyright example.com, all rights reserved, since forever.</p></footer>
+</body>
+</html>'''
+
+WEBFORMS_PAGE = '''<html>
+<body>
+<form method="post" action="./article.aspx">
+<nav><p>Home, News, Sports, Weather, Contacts, all the sections of the website.</p></nav>
+<div class="content">
+<p>First paragraph of the article, long enough to be considered by the heuristics.</p>
+<p>Second paragraph of the article, with some commas, a few of them, to score it higher.</p>
+<form class="comments"><textarea>Leave a comment</textarea></form>
+</div>
+</form>
+</body>
+</html>'''
+
+
+class StubExtractor(ContentExtractor):
+    def __init__(self, logger, name, prefix):
+        super().__init__(logger)
+        self.name = name
+        self.prefix = prefix
+        self.calls = 0
+
+    def extract(self, link, html):
+        self.calls += 1
+        return '<p>{0} {1}</p>'.format(self.prefix, html)
+
+
+class Test002ExtractorsTests(unittest2.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('Custom logger')
+
+    def test_001_build_extractor_default(self):
+        extractor = build_extractor(self.logger, None)
+
+        self.assertIsInstance(extractor, NewspaperExtractor)
+
+    def test_002_build_extractor_unknown_engine(self):
+        with self.assertRaises(ExtractorError):
+            build_extractor(self.logger, {'engine': 'unknown'})
+
+    def test_003_lxml_readability(self):
+        extractor = build_extractor(self.logger, {'engine': 'lxml'})
+
+        content = extractor.extract('https://example.com/article', SAMPLE_PAGE)
+
+        self.assertIn('First paragraph of the article', content)
+        self.assertIn('Second paragraph of the article', content)
+        self.assertIn('https://example.com/image.jpg', content)
+        self.assertNotIn('newsletter', content)
+        self.assertNotIn('Copyright', content)
+
+    def test_004_lxml_xpath(self):
+        extractor = build_extractor(self.logger, {'engine': 'lxml', 'xpath': '//div[@class="article-body"]/p[2]'})
+
+        content = extractor.extract('https://example.com/article', SAMPLE_PAGE)
+
+        self.assertEqual(content, '<p>Second paragraph of the article, with some commas, a few of them, '
+                                  'to score it higher.</p>')
+
+    def test_005_lxml_selector_without_match(self):
+        extractor = build_extractor(self.logger, {'engine': 'lxml', 'xpath': '//div[@id="missing"]'})
+
+        self.assertIsNone(extractor.extract('https://example.com/article', SAMPLE_PAGE))
+
+    def test_006_newspaper_options(self):
+        default_extractor = build_extractor(self.logger, {'engine': 'newspaper'})
+        extractor = build_extractor(self.logger, {'engine': 'newspaper', 'fetch_images': True, 'language': 'it'})
+
+        self.assertFalse(default_extractor.fetch_images)
+        self.assertFalse(default_extractor.memoize_articles)
+        self.assertTrue(extractor.fetch_images)
+        self.assertEqual(extractor.language, 'it')
+
+    def test_007_lxml_css(self):
+        extractor = build_extractor(self.logger, {'engine': 'lxml', 'css': 'div.article-body > p'})
+
+        content = extractor.extract('https://example.com/article', SAMPLE_PAGE)
+
+        self.assertIn('First paragraph of the article', content)
+        self.assertNotIn('newsletter', content)
+
+    def test_008_lxml_invalid_selectors(self):
+        with self.assertRaises(ExtractorError):
+            build_extractor(self.logger, {'engine': 'lxml', 'css': 'div['})
+        with self.assertRaises(ExtractorError):
+            build_extractor(self.logger, {'engine': 'lxml', 'xpath': '//div['})
+
+    def test_009_benchmark_extractors(self):
+        reference = StubExtractor(self.logger, 'reference', 'same text')
+        candidate = StubExtractor(self.logger, 'candidate', 'same text')
+        different = StubExtractor(self.logger, 'different', 'completely unrelated words')
+        documents = [('https://example.com/1', 'one'), ('https://example.com/2', 'two')]
+
+        results = benchmark_extractors(self.logger, reference, candidate, documents)
+        different_results = benchmark_extractors(self.logger, reference, different, documents)
+
+        self.assertEqual(results['articles'], 2)
+        self.assertGreater(results['reference_articles_per_sec'], 0)
+        self.assertGreater(results['candidate_articles_per_sec'], 0)
+        self.assertEqual(results['similarity'], 1.0)
+        self.assertLess(different_results['similarity'], 0.5)
+        # One untimed extraction before the timed ones
+        self.assertEqual(candidate.calls, 3)
+
+    def test_010_lxml_page_wrapped_in_a_form(self):
+        extractor = build_extractor(self.logger, {'engine': 'lxml'})
+        css_extractor = build_extractor(self.logger, {'engine': 'lxml', 'css': 'form .content'})
+
+        content = extractor.extract('https://example.com/article.aspx', WEBFORMS_PAGE)
+        css_content = css_extractor.extract('https://example.com/article.aspx', WEBFORMS_PAGE)
+
+        self.assertIn('First paragraph of the article', content)
+        self.assertIn('Second paragraph of the article', content)
+        self.assertNotIn('Leave a comment', content)
+        self.assertNotIn('all the sections', content)
+        self.assertIn('First paragraph of the article', css_content)
+
+    def test_011_lxml_xhtml_with_xml_declaration(self):
+        extractor = build_extractor(self.logger, {'engine': 'lxml'})
+        page = '<?xml version="1.0" encoding="utf-8"?>\n' + SAMPLE_PAGE.replace(
+            '<html>', '<html xmlns="http://www.w3.org/1999/xhtml">', 1)
+
+        content = extractor.extract('https://example.com/article', page)
+
+        self.assertIn('First paragraph of the article', content)
+
+
+if __name__ == '__main__':
+    unittest2.main()
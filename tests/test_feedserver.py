@@ -0,0 +1,133 @@
+import unittest2
+import logging
+import datetime
+import gzip
+import http.client
+import threading
+from feedserver import *
+
+
+class Test003FeedServerTests(unittest2.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('Custom logger')
+
+    def test_001_publish(self):
+        feed_store = FeedStore(self.logger)
+        feed_store.publish('feed.xml', b'<rss></rss>')
+
+        served_feed = feed_store.get('feed.xml')
+
+        self.assertEqual(served_feed.body, b'<rss></rss>')
+        self.assertEqual(gzip.decompress(served_feed.gzip_body), b'<rss></rss>')
+        self.assertNotEqual(served_feed.etag, served_feed.gzip_etag)
+        self.assertIsNone(feed_store.get('missing.xml'))
+
+    def test_002_publish_unchanged_feed(self):
+        feed_store = FeedStore(self.logger)
+        generated = datetime.datetime(2018, 11, 4, 16, 0, 6, tzinfo=datetime.timezone.utc)
+        feed_store.publish('feed.xml', b'<rss></rss>', generated)
+
+        feed_store.publish('feed.xml', b'<rss></rss>')
+
+        self.assertEqual(feed_store.get('feed.xml').last_modified, generated)
+
+    def test_003_duplicate_feed_names(self):
+        duplicates = duplicate_feed_names(['/srv/a/feed.xml', '/srv/b/feed.xml', '/srv/other.xml'])
+
+        self.assertEqual(duplicates, {'feed.xml': ['/srv/a/feed.xml', '/srv/b/feed.xml']})
+        self.assertEqual(duplicate_feed_names(['/srv/a/feed.xml', '/srv/other.xml']), {})
+
+
+class Test006FeedServerHTTPTests(unittest2.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('Custom logger')
+        self.feed_store = FeedStore(self.logger)
+        self.feed_store.publish('feed.xml', b'<rss>' + b'<item>Entry</item>' * 100 + b'</rss>')
+        self.server = make_server(self.logger, self.feed_store, '127.0.0.1', 0)
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def request(self, path='/feed.xml', method='GET', headers=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=5)
+        try:
+            connection.request(method, path, headers=headers or dict())
+            response = connection.getresponse()
+            return response, response.read()
+        finally:
+            connection.close()
+
+    def test_001_gzip_negotiation(self):
+        served_feed = self.feed_store.get('feed.xml')
+
+        response, body = self.request(headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader('Content-Encoding'), 'gzip')
+        self.assertEqual(response.getheader('ETag'), served_feed.gzip_etag)
+        self.assertEqual(response.getheader('Vary'), 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(body), served_feed.body)
+
+        for accept_encoding in ('identity', 'gzip;q=0'):
+            response, body = self.request(headers={'Accept-Encoding': accept_encoding})
+            self.assertEqual(response.status, 200)
+            self.assertIsNone(response.getheader('Content-Encoding'))
+            self.assertEqual(response.getheader('ETag'), served_feed.etag)
+            self.assertEqual(body, served_feed.body)
+
+    def test_002_if_none_match(self):
+        served_feed = self.feed_store.get('feed.xml')
+
+        response, body = self.request(headers={'Accept-Encoding': 'gzip', 'If-None-Match': served_feed.gzip_etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(body, b'')
+        self.assertEqual(response.getheader('ETag'), served_feed.gzip_etag)
+
+        response, body = self.request(headers={'If-None-Match': 'W/{0}'.format(served_feed.etag)})
+        self.assertEqual(response.status, 304)
+
+        # The ETag of the gzipped body doesn't match the uncompressed one
+        response, body = self.request(headers={'If-None-Match': served_feed.gzip_etag})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, served_feed.body)
+
+    def test_003_if_modified_since(self):
+        response, _ = self.request()
+        last_modified = response.getheader('Last-Modified')
+
+        response, body = self.request(headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(body, b'')
+
+        response, body = self.request(headers={'If-Modified-Since': 'Sun, 04 Nov 2018 16:00:06 GMT'})
+        self.assertEqual(response.status, 200)
+
+        # If-None-Match takes precedence over If-Modified-Since
+        response, body = self.request(headers={'If-Modified-Since': last_modified, 'If-None-Match': '"other"'})
+        self.assertEqual(response.status, 200)
+
+    def test_004_head(self):
+        response, body = self.request(method='HEAD')
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, b'')
+        self.assertEqual(int(response.getheader('Content-Length')), len(self.feed_store.get('feed.xml').body))
+
+    def test_005_not_found(self):
+        response, _ = self.request('/missing.xml')
+
+        self.assertEqual(response.status, 404)
+
+    def test_006_new_generation(self):
+        old_etag = self.feed_store.get('feed.xml').etag
+        self.feed_store.publish('feed.xml', b'<rss>New generation</rss>')
+
+        response, body = self.request(headers={'If-None-Match': old_etag})
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, b'<rss>New generation</rss>')
+
+
+if __name__ == '__main__':
+    unittest2.main()
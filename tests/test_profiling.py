@@ -0,0 +1,88 @@
+import unittest2
+import logging
+import concurrent.futures
+import os
+import pstats
+import shutil
+import tempfile
+import tracemalloc
+from profiling import *
+
+
+def build_strings(n):
+    return [str(i) for i in range(n)]
+
+
+def sort_strings(n):
+    return sorted(build_strings(n))
+
+
+def sort_strings_in_worker(n):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(call, sort_strings, n).result()
+
+
+class Test005ProfilingTests(unittest2.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('Custom logger')
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def function_names(self, path):
+        return [name for (_, _, name) in pstats.Stats(path).stats]
+
+    def test_001_profile_call_outputs(self):
+        result = profile_call(self.logger, 'My website/1', self.directory, True, True, sort_strings, 1000)
+
+        self.assertEqual(result, sorted(str(i) for i in range(1000)))
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['My_website_1.collapsed', 'My_website_1.pstats', 'My_website_1.tracemalloc'])
+        self.assertIn('build_strings', self.function_names(os.path.join(self.directory, 'My_website_1.pstats')))
+        snapshot = tracemalloc.Snapshot.load(os.path.join(self.directory, 'My_website_1.tracemalloc'))
+        self.assertTrue(snapshot.statistics('lineno'))
+
+    def test_002_profile_call_worker_threads(self):
+        profile_call(self.logger, 'worker', self.directory, True, False, sort_strings_in_worker, 1000)
+
+        function_names = self.function_names(os.path.join(self.directory, 'worker.pstats'))
+        self.assertIn('sort_strings_in_worker', function_names)
+        self.assertIn('build_strings', function_names)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'worker.tracemalloc')))
+
+    def test_003_call_without_profile(self):
+        self.assertEqual(call(sort_strings, 3), ['0', '1', '2'])
+
+    def test_004_write_collapsed_stacks(self):
+        stats = pstats.Stats()
+        stats.stats = {
+            ('main.py', 1, 'main'): (1, 1, 0.001, 0.003, {}),
+            ('main.py', 5, 'child'): (1, 1, 0.002, 0.002, {('main.py', 1, 'main'): (1, 1, 0.002, 0.002)}),
+            ('~', 0, '<built-in method len>'): (1, 1, 0.0, 0.0, {('main.py', 5, 'child'): (1, 1, 0.0, 0.0)}),
+        }
+        path = os.path.join(self.directory, 'stacks.collapsed')
+
+        write_collapsed_stacks(stats, path)
+
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines, ['main.py:1:main 1000', 'main.py:1:main;main.py:5:child 2000'])
+
+    def test_005_section_profile_over_several_calls(self):
+        profile = SectionProfile(self.logger, 'progressive', self.directory, True, True)
+
+        self.assertEqual(profile.call(build_strings, 1000)[:2], ['0', '1'])
+        profile.call(sorted, ['b', 'a'])
+        profile.save()
+
+        function_names = self.function_names(os.path.join(self.directory, 'progressive.pstats'))
+        self.assertIn('build_strings', function_names)
+        self.assertIn('<built-in method builtins.sorted>', function_names)
+        snapshot = tracemalloc.Snapshot.load(os.path.join(self.directory, 'progressive.tracemalloc'))
+        self.assertTrue(any(statistic.traceback[0].filename == __file__
+                            for statistic in snapshot.statistics('lineno')))
+
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -0,0 +1,84 @@
+import unittest2
+import logging
+import threading
+import requests
+from requestcounter import *
+
+
+class DummyAdapter(requests.adapters.BaseAdapter):
+    """
+    Answer every request with an empty response, without using the network
+    """
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = request.url
+        response.request = request
+        response._content = b''
+        return response
+
+    def close(self):
+        pass
+
+
+class Test007RequestCounterTests(unittest2.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('Custom logger')
+        self.session = requests.Session()
+        self.session.mount('http://', DummyAdapter())
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_001_count_requests(self):
+        original_send = requests.Session.send
+
+        with RequestCounter(self.logger) as request_counter:
+            self.assertIsNot(requests.Session.send, original_send)
+
+            with own_requests():
+                self.session.get('http://example.com/article')
+            self.session.get('http://images.example.com/1.jpg')
+            self.session.get('http://images.example.com/2.jpg')
+            self.session.get('http://cdn.example.net/style.css')
+
+            additional_requests = request_counter.pop()
+            self.assertEqual(additional_requests, ['http://images.example.com/1.jpg',
+                                                   'http://images.example.com/2.jpg',
+                                                   'http://cdn.example.net/style.css'])
+            self.assertEqual(request_counter.summary(additional_requests),
+                             'images.example.com: 2, cdn.example.net: 1')
+            self.assertEqual(request_counter.pop(), [])
+
+        self.assertIs(requests.Session.send, original_send)
+
+    def test_002_restore_on_error(self):
+        original_send = requests.Session.send
+
+        with self.assertRaises(ValueError):
+            with RequestCounter(self.logger):
+                raise ValueError
+
+        self.assertIs(requests.Session.send, original_send)
+
+    def test_003_count_requests_by_section(self):
+        with RequestCounter(self.logger) as request_counter:
+            with section('first'):
+                self.session.get('http://images.example.com/1.jpg')
+                # A worker thread still running for the first section while the second one runs
+                worker = threading.Thread(target=call, args=(current_section(), self.session.get,
+                                                             'http://images.example.com/2.jpg'))
+            with section('second'):
+                self.session.get('http://cdn.example.net/style.css')
+                worker.start()
+                worker.join()
+
+            self.assertEqual(request_counter.pop('second'), ['http://cdn.example.net/style.css'])
+            self.assertEqual(request_counter.pop('first'), ['http://images.example.com/1.jpg',
+                                                            'http://images.example.com/2.jpg'])
+            self.assertEqual(request_counter.pop(), [])
+
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -0,0 +1,62 @@
+import unittest2
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from sqlitecache import *
+
+
+class Test004SQliteCacheTests(unittest2.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('Custom logger')
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'blasterfeed-cache.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_001_insert_search_clean(self):
+        with SQliteCacheHandler(self.logger, self.path) as sq:
+            sq.insert('https://example.com/', 'https://example.com/1', '2018-11-04', 'Content 1')
+            sq.insert('https://example.com/', 'https://example.com/2', '2018-11-04', 'Content 2')
+            sq.insert('https://other.com/', 'https://other.com/1', '2018-11-04', 'Other content')
+            sq.flush()
+
+            self.assertEqual(sq.search('https://example.com/1')[4], 'Content 1')
+
+            sq.clean('https://example.com/', ['https://example.com/2'])
+            sq.flush()
+
+            self.assertIsNone(sq.search('https://example.com/1'))
+            self.assertEqual(sq.search('https://example.com/2')[4], 'Content 2')
+            self.assertEqual(sq.search('https://other.com/1')[4], 'Other content')
+
+    def test_002_concurrent_workers(self):
+        errors = list()
+
+        def worker(sq, number):
+            try:
+                for i in range(20):
+                    link = 'https://example.com/{0}/{1}'.format(number, i)
+                    sq.search(link)
+                    sq.insert('https://example.com/', link, '2018-11-04', 'Content')
+            except Exception as e:
+                errors.append(e)
+
+        with SQliteCacheHandler(self.logger, self.path) as sq:
+            threads = [threading.Thread(target=worker, args=(sq, number)) for number in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # The queued inserts are committed when the cache is closed
+        with SQliteCacheHandler(self.logger, self.path) as sq:
+            self.assertEqual(sq.search('https://example.com/7/19')[4], 'Content')
+
+        self.assertEqual(errors, [])
+
+
+if __name__ == '__main__':
+    unittest2.main()